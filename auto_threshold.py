@@ -0,0 +1,103 @@
+"""
+auto_threshold.py
+
+Threshold auto-selection shared by the CLI and the GUI.
+
+Sweeps a handful of candidate thresholds on a heavily decimated detection
+pass, counts scenes N(tau) at each, and picks the tau at the sharpest
+drop-off in scene count (max negative slope). That knee tends to sit just
+past the noise floor, so one sweep replaces several manual tune-and-rerun
+cycles.
+"""
+import concurrent.futures
+import os
+
+# Candidate sweeps per detector, ordered ascending. Centered on the
+# defaults used by the GUI with a spread wide enough to bracket the knee.
+THRESHOLD_CANDIDATES = {
+    'adaptive': [1.0, 2.0, 3.0, 5.0, 8.0, 12.0],
+    'content': [15.0, 21.0, 27.0, 35.0, 45.0, 60.0],
+    'threshold': [4.0, 8.0, 12.0, 20.0, 30.0, 45.0],
+    'hist': [0.02, 0.05, 0.10, 0.20, 0.40, 0.60],
+}
+
+# Sweep passes only need to rank candidates by scene count, not find exact
+# cut frames, so they run aggressively decimated.
+SWEEP_DOWNSCALE = 8
+SWEEP_FRAME_SKIP = 2
+
+# (video identity, algorithm) -> chosen threshold, so re-runs on the same
+# file skip the sweep entirely.
+_sweep_cache = {}
+
+
+def _video_cache_key(video_path):
+    """Cheap identity key; hashing the whole file would defeat the purpose."""
+    st = os.stat(video_path)
+    return (os.path.abspath(video_path), st.st_size, st.st_mtime_ns)
+
+
+def count_scenes_at_threshold(video_path, algorithm, threshold, min_scene_len=15):
+    """Count scenes at one candidate threshold on a decimated pass.
+
+    Module-level (with local imports) so ProcessPoolExecutor can pickle it
+    and workers pay import cost only once each.
+    """
+    from scenedetect import SceneManager
+    from scenedetect.detectors import AdaptiveDetector, ThresholdDetector, HistogramDetector
+
+    from fast_detectors import FastContentDetector
+    from video_backend import open_video_stream
+
+    video = open_video_stream(video_path)
+    scene_manager = SceneManager()
+    scene_manager.auto_downscale = False
+    scene_manager.downscale = SWEEP_DOWNSCALE
+    if algorithm == 'adaptive':
+        detector = AdaptiveDetector(adaptive_threshold=threshold, min_scene_len=min_scene_len)
+    elif algorithm == 'content':
+        detector = FastContentDetector(threshold=threshold, min_scene_len=min_scene_len)
+    elif algorithm == 'threshold':
+        detector = ThresholdDetector(threshold=threshold, min_scene_len=min_scene_len)
+    elif algorithm == 'hist':
+        detector = HistogramDetector(threshold=threshold, min_scene_len=min_scene_len)
+    else:
+        raise ValueError(f"Unknown algorithm: {algorithm}")
+    scene_manager.add_detector(detector)
+    scene_manager.detect_scenes(video=video, frame_skip=SWEEP_FRAME_SKIP, show_progress=False)
+    return len(scene_manager.get_scene_list())
+
+
+def select_auto_threshold(video_path, algorithm, min_scene_len=15, status_callback=None):
+    """Pick a threshold for algorithm by sweeping candidates in parallel.
+
+    Returns the candidate at the largest negative slope of N(tau). Results
+    are cached per (file, algorithm) for the lifetime of the process.
+    """
+    candidates = THRESHOLD_CANDIDATES[algorithm]
+    cache_key = (_video_cache_key(video_path), algorithm)
+    if cache_key in _sweep_cache:
+        return _sweep_cache[cache_key]
+
+    if status_callback:
+        status_callback(f"Sweeping {len(candidates)} threshold candidates...")
+    max_workers = min(len(candidates), os.cpu_count() or 1)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        counts = list(executor.map(
+            count_scenes_at_threshold,
+            [video_path] * len(candidates),
+            [algorithm] * len(candidates),
+            candidates,
+            [min_scene_len] * len(candidates),
+        ))
+
+    best_idx = 0
+    best_slope = None
+    for i in range(1, len(candidates)):
+        slope = (counts[i] - counts[i - 1]) / (candidates[i] - candidates[i - 1])
+        if best_slope is None or slope < best_slope:
+            best_slope = slope
+            best_idx = i
+    chosen = candidates[best_idx]
+    _sweep_cache[cache_key] = chosen
+    return chosen
@@ -0,0 +1,60 @@
+"""
+fast_detectors.py
+
+OpenCV-accelerated variants of the PySceneDetect detectors used by the CLI
+and the GUI. OpenCV's reductions (absdiff/mean) run SIMD-vectorized inside
+the library, which is measurably faster than the stock per-plane NumPy
+arithmetic on the per-frame hot path.
+"""
+import cv2
+
+from scenedetect.detectors import ContentDetector
+
+try:
+    from scenedetect.detectors import threshold_detector as _threshold_detector
+except ImportError:
+    _threshold_detector = None
+
+
+class FastContentDetector(ContentDetector):
+    """ContentDetector computing the HSV frame score with cv2 primitives.
+
+    cv2.absdiff + cv2.mean reduce whole frames in one SIMD pass and avoid
+    the intermediate widened arrays of the stock NumPy implementation.
+    Falls back to the stock scoring when edge weighting is enabled, which
+    needs the per-plane pipeline.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._fast_last_hsv = None
+
+    def _calculate_frame_score(self, frame_num, frame_img):
+        weights = getattr(self, '_weights', ContentDetector.DEFAULT_COMPONENT_WEIGHTS)
+        if weights.delta_edges > 0:
+            return super()._calculate_frame_score(frame_num, frame_img)
+        hsv = cv2.cvtColor(frame_img, cv2.COLOR_BGR2HSV)
+        last_hsv = self._fast_last_hsv
+        self._fast_last_hsv = hsv
+        if last_hsv is None:
+            return 0.0
+        delta_hue, delta_sat, delta_lum = cv2.mean(cv2.absdiff(last_hsv, hsv))[:3]
+        total_weight = weights.delta_hue + weights.delta_sat + weights.delta_lum + weights.delta_edges
+        return (
+            delta_hue * weights.delta_hue
+            + delta_sat * weights.delta_sat
+            + delta_lum * weights.delta_lum
+        ) / total_weight
+
+
+def fast_frame_average(frame):
+    """Drop-in for threshold_detector.compute_frame_average using cv2.mean."""
+    channels = 1 if frame.ndim == 2 else frame.shape[2]
+    return sum(cv2.mean(frame)[:channels]) / channels
+
+
+# ThresholdDetector reduces every frame through the module-level
+# compute_frame_average; swapping in the cv2 version accelerates all
+# instances without having to replicate its fade in/out state machine.
+if _threshold_detector is not None and hasattr(_threshold_detector, 'compute_frame_average'):
+    _threshold_detector.compute_frame_average = fast_frame_average
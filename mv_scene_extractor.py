@@ -5,16 +5,33 @@ mv_scene_extractor.py
 2D 뮤직비디오 장면 이미지 추출용 중간 프레임 타임코드 계산 스크립트
 """
 import argparse
-from scenedetect import VideoManager, SceneManager
-from scenedetect.detectors import AdaptiveDetector, ContentDetector, ThresholdDetector, HistogramDetector
+from scenedetect import SceneManager
+from scenedetect.detectors import AdaptiveDetector, ThresholdDetector, HistogramDetector
+
+from auto_threshold import select_auto_threshold
+# Importing fast_detectors also swaps ThresholdDetector's frame-average
+# reduction for the cv2 version.
+from fast_detectors import FastContentDetector
+from video_backend import detection_downscale, ffmpeg_hwaccel_args, open_video_stream
+import asyncio
 import os
 import subprocess
+import tempfile
+
+# Keep the select filter expression bounded: very long '-vf' arguments can hit
+# the OS argument-length limit and slow down ffmpeg's expression parser.
+SELECT_BATCH_SIZE = 200
 
 
 def detect_scenes(video_path, algorithm='adaptive', threshold=3.0, min_scene_len=15, window_size=2, min_content_val=15.0):
     """Detect scene boundaries using specified detector algorithm."""
-    video_manager = VideoManager([video_path])
+    video = open_video_stream(video_path)
     scene_manager = SceneManager()
+    # Downscale before detection: pixel differencing cost drops quadratically
+    # with the downscale factor and accuracy loss is negligible. Capping the
+    # width at ~320 px downscales more aggressively than auto_downscale.
+    scene_manager.auto_downscale = False
+    scene_manager.downscale = detection_downscale(video.frame_size[0])
     # Choose detector
     if algorithm == 'adaptive':
         detector = AdaptiveDetector(
@@ -24,7 +41,7 @@ def detect_scenes(video_path, algorithm='adaptive', threshold=3.0, min_scene_len
             min_content_val=min_content_val
         )
     elif algorithm == 'content':
-        detector = ContentDetector(threshold=threshold, min_scene_len=min_scene_len)
+        detector = FastContentDetector(threshold=threshold, min_scene_len=min_scene_len)
     elif algorithm == 'threshold':
         detector = ThresholdDetector(threshold=threshold, min_scene_len=min_scene_len)
     elif algorithm == 'hist':
@@ -32,11 +49,8 @@ def detect_scenes(video_path, algorithm='adaptive', threshold=3.0, min_scene_len
     else:
         raise ValueError(f"Unknown algorithm: {algorithm}")
     scene_manager.add_detector(detector)
-    video_manager.start()
-    scene_manager.detect_scenes(frame_source=video_manager)
-    scene_list = scene_manager.get_scene_list()
-    video_manager.release()
-    return scene_list
+    scene_manager.detect_scenes(video=video, show_progress=False)
+    return scene_manager.get_scene_list()
 
 
 def calculate_midframes(scenes):
@@ -52,15 +66,88 @@ def calculate_midframes(scenes):
     return midframes
 
 
-def extract_frames(video_path, midframes, output_dir, image_ext='jpg'):
-    """Extract single frames at given timecodes using ffmpeg."""
+def timecode_to_frame(timecode, frame_rate):
+    """Convert an HH:MM:SS.mmm timecode string to an integer frame number."""
+    hours, minutes, seconds = timecode.split(':')
+    total_sec = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    return int(round(total_sec * frame_rate))
+
+
+def extract_frames(video_path, midframes, output_dir, image_ext='jpg', frame_rate=None):
+    """Extract single frames at given timecodes using ffmpeg.
+
+    When frame_rate is known, all frames are pulled in a single ffmpeg
+    invocation per batch using a select filter, avoiding one process spawn
+    and container open per frame. Otherwise falls back to per-frame seeks.
+    """
     os.makedirs(output_dir, exist_ok=True)
-    for idx, tc in enumerate(midframes, start=1):
-        out_path = os.path.join(output_dir, f"{idx:04d}.{image_ext}")
-        subprocess.run(
-            ['ffmpeg', '-y', '-ss', tc, '-i', video_path, '-vframes', '1', out_path],
-            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-        )
+    if frame_rate is None:
+        extract_frames_seek(video_path, midframes, output_dir, image_ext)
+        return
+    frame_nums = [timecode_to_frame(tc, frame_rate) for tc in midframes]
+    # Hoisted out of the loops: path joins cost a few us each, which adds up
+    # over thousands of frames.
+    out_template = os.path.join(output_dir, f"{{:04d}}.{image_ext}")
+    for batch_start in range(0, len(frame_nums), SELECT_BATCH_SIZE):
+        batch = frame_nums[batch_start:batch_start + SELECT_BATCH_SIZE]
+        select_expr = "+".join(f"eq(n,{fn})" for fn in batch)
+        with tempfile.TemporaryDirectory(dir=output_dir) as tmp_dir:
+            subprocess.run(
+                ['ffmpeg', '-y', *ffmpeg_hwaccel_args(), '-i', video_path,
+                 '-vf', f"select='{select_expr}',setpts=N/FRAME_RATE/TB",
+                 '-vsync', '0', '-q:v', '2',
+                 os.path.join(tmp_dir, f"%04d.{image_ext}")],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            # ffmpeg numbers outputs 0001..000N per batch, in batch order, but
+            # only if every requested frame was produced. A short batch (decode
+            # error, or a frame number rounded past EOF) would shift every
+            # later rename onto the wrong global index, so redo such batches
+            # with per-frame seeks instead of renaming positionally.
+            if len(os.listdir(tmp_dir)) != len(batch):
+                extract_frames_seek(
+                    video_path, midframes[batch_start:batch_start + len(batch)],
+                    output_dir, image_ext, start_index=batch_start + 1
+                )
+                continue
+            tmp_template = os.path.join(tmp_dir, f"{{:04d}}.{image_ext}")
+            for batch_idx in range(1, len(batch) + 1):
+                os.replace(tmp_template.format(batch_idx), out_template.format(batch_start + batch_idx))
+
+
+def extract_frames_seek(video_path, midframes, output_dir, image_ext='jpg', start_index=1):
+    """Per-frame fallback: one ffmpeg seek per timecode, run concurrently.
+
+    Each job input-seeks ('-ss' before '-i') so it demuxes to the nearest
+    keyframe and exits quickly. Subprocesses are launched with asyncio so
+    no worker threads are needed; a semaphore bounds concurrency to the
+    core count. start_index sets the global index of the first output file,
+    so a single batch can be redone in place.
+    """
+    # Hoisted out of the per-frame jobs: only '-ss', the input, and the
+    # output path vary between invocations.
+    out_template = os.path.join(output_dir, f"{{:04d}}.{image_ext}")
+    cmd_prefix = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', *ffmpeg_hwaccel_args()]
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(min(os.cpu_count() or 1, 16))
+
+        async def extract_one(idx, tc):
+            out_path = out_template.format(idx)
+            async with semaphore:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd_prefix, '-ss', tc, '-i', video_path,
+                    '-frames:v', '1', '-q:v', '2', '-f', 'image2', out_path,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL
+                )
+                await proc.wait()
+
+        await asyncio.gather(*(
+            extract_one(idx, tc) for idx, tc in enumerate(midframes, start=start_index)
+        ))
+
+    asyncio.run(run_all())
 
 
 def main():
@@ -90,23 +177,35 @@ def main():
         "-a", "--algorithm", choices=['adaptive','content','threshold','hist'], default='adaptive',
         help="Detector algorithm to use (adaptive, content, threshold, hist)."
     )
+    parser.add_argument(
+        "--auto-threshold", action="store_true",
+        help="Sweep candidate thresholds on a decimated pass and pick one automatically."
+    )
     parser.add_argument(
         "-o", "--output", default="midframes",
         help="Output directory for extracted images."
     )
     args = parser.parse_args()
 
+    threshold = args.threshold
+    if args.auto_threshold:
+        threshold = select_auto_threshold(args.video_path, args.algorithm, args.min_scene_len)
+        print(f"Auto-selected threshold: {threshold}")
+
     scenes = detect_scenes(
         args.video_path,
         args.algorithm,
-        args.threshold,
+        threshold,
         args.min_scene_len,
         args.window_size,
         args.min_content_val
     )
     midframes = calculate_midframes(scenes)
 
-    extract_frames(args.video_path, midframes, args.output)
+    # FrameTimecode objects carry the source frame rate; needed to map
+    # midframe timecodes onto frame numbers for the batched select filter.
+    frame_rate = scenes[0][0].framerate if scenes else None
+    extract_frames(args.video_path, midframes, args.output, frame_rate=frame_rate)
     print(f"Detected {len(scenes)} scenes.")
     print(f"Extracted {len(midframes)} images to {args.output}/")
 
@@ -24,79 +24,88 @@ from flet import (
     alignment
 )
 import os
+import queue
 import subprocess
 import threading
 import time # For potential delays or simulations if needed
 
+import numpy as np
+
 # PySceneDetect imports
-from scenedetect import VideoManager, SceneManager
-from scenedetect.detectors import AdaptiveDetector, ContentDetector, ThresholdDetector, HistogramDetector
-# FrameTimecode is part of scenedetect, needed for calculate_midframes_logic
-from scenedetect.frame_timecode import FrameTimecode
+from scenedetect import SceneManager
+from scenedetect.detectors import AdaptiveDetector, ThresholdDetector, HistogramDetector
+
+from auto_threshold import select_auto_threshold
+# Importing fast_detectors also swaps ThresholdDetector's frame-average
+# reduction for the cv2 version.
+from fast_detectors import FastContentDetector
+from video_backend import detection_downscale, ffmpeg_hwaccel_args, open_video_stream
 
 
 # --- Core logic adapted from mv_scene_extractor.py ---
 
-def calculate_midframes_logic(scenes, frame_rate):
-    """Calculate mid-point timecodes for each scene."""
-    midframes_tc_obj = [] # To store FrameTimecode objects for ffmpeg
-    midframes_display = [] # To store string timecodes for display/logging if needed
-    for start_tc_obj, end_tc_obj in scenes:
-        # Ensure start_tc_obj and end_tc_obj are FrameTimecode objects
-        # If they are already FrameTimecode objects from PySceneDetect, great.
-        # If they are in seconds (float), convert them.
-        
-        start_seconds = start_tc_obj.get_seconds()
-        end_seconds = end_tc_obj.get_seconds()
+def seconds_to_timecode(total_sec):
+    """Format seconds as an HH:MM:SS.mmm timecode string."""
+    hours = int(total_sec // 3600)
+    minutes = int((total_sec % 3600) // 60)
+    seconds_part = total_sec % 60
+    return f"{hours:02d}:{minutes:02d}:{seconds_part:06.3f}"
+
+
+# Width of the thumbnails fed to the GUI grid. Rendering full-resolution
+# JPEGs into 150px grid cells wastes decode time and memory bandwidth in the
+# Flet renderer, so the grid gets small copies made from the same decode.
+THUMBNAIL_WIDTH = 320
+
+
+def single_frame_cmd(video_path, tc_str, out_path, thumb_path=None):
+    """Build the ffmpeg command extracting one frame at tc_str via input-seek.
+
+    When thumb_path is given, the same decoded frame is additionally written
+    there scaled to THUMBNAIL_WIDTH - one decode, two outputs.
+    """
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y',
+           *ffmpeg_hwaccel_args(), '-ss', tc_str, '-i', video_path,
+           '-frames:v', '1', '-q:v', '2', '-f', 'image2', out_path] # -q:v 2 for high quality JPEG
+    if thumb_path is not None:
+        cmd += ['-frames:v', '1', '-vf', f'scale={THUMBNAIL_WIDTH}:-1',
+                '-q:v', '4', '-f', 'image2', thumb_path]
+    return cmd
+
+
+def extract_one_frame(video_path, idx, tc_str, output_dir, image_ext='jpg'):
+    """Extract a single frame at tc_str to output_dir via a fast input-seek.
+
+    Writes the full-resolution JPEG to output_dir and a GUI-sized thumbnail
+    to output_dir/thumbs in the same invocation; returns both paths. The
+    caller must have created both directories (this runs once per frame).
+    Raises subprocess.CalledProcessError on ffmpeg failure and
+    FileNotFoundError when ffmpeg is not installed.
+    """
+    out_path = os.path.join(output_dir, f"{idx:04d}.{image_ext}")
+    thumb_path = os.path.join(output_dir, "thumbs", f"{idx:04d}.{image_ext}")
+    subprocess.run(
+        single_frame_cmd(video_path, tc_str, out_path, thumb_path),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True # Capture stderr for errors
+    )
+    return out_path, thumb_path
 
-        mid_sec = (start_seconds + end_seconds) / 2.0
-        
-        # Create a FrameTimecode object for precise ffmpeg seeking
-        mid_frame = int(mid_sec * frame_rate)
-        mid_tc_obj = FrameTimecode(timecode=mid_frame, fps=frame_rate)
-        midframes_tc_obj.append(mid_tc_obj.get_timecode()) # Get HH:MM:SS.mmm string
-
-        # For display purposes, if needed
-        hours = int(mid_sec // 3600)
-        minutes = int((mid_sec % 3600) // 60)
-        seconds_part = mid_sec % 60
-        timecode_display = f"{hours:02d}:{minutes:02d}:{seconds_part:06.3f}"
-        midframes_display.append(timecode_display)
-        
-    return midframes_tc_obj # Return list of HH:MM:SS.mmm strings
-
-def extract_frames_logic(video_path, midframe_timecodes, output_dir, image_ext='jpg', status_callback=None, image_callback=None):
-    """Extract single frames at given timecodes using ffmpeg."""
-    os.makedirs(output_dir, exist_ok=True)
-    extracted_images_paths = []
-    for idx, tc_str in enumerate(midframe_timecodes, start=1):
-        out_path = os.path.join(output_dir, f"{idx:04d}.{image_ext}")
-        if status_callback:
-            status_callback(f"Extracting frame {idx}/{len(midframe_timecodes)}: {tc_str}")
-        
-        try:
-            subprocess.run(
-                ['ffmpeg', '-y', '-ss', tc_str, '-i', video_path, '-vframes', '1', '-q:v', '2', out_path], # -q:v 2 for high quality JPEG
-                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True # Capture stderr for errors
-            )
-            extracted_images_paths.append(out_path)
-            if image_callback:
-                image_callback(out_path)
-        except subprocess.CalledProcessError as e:
-            error_message = f"ffmpeg error for {tc_str}: {e.stderr.decode() if e.stderr else 'Unknown error'}"
-            if status_callback:
-                status_callback(error_message) # Update UI with ffmpeg error
-            print(error_message) # Also print to console for debugging
-            # Decide if you want to stop or continue on ffmpeg error
-            # For now, it continues but the overall success might be impacted
-        except FileNotFoundError:
-            error_message = "ffmpeg command not found. Please ensure ffmpeg is installed and in your PATH."
-            if status_callback:
-                status_callback(error_message)
-            print(error_message)
-            raise # Re-raise to stop the process
-            
-    return extracted_images_paths
+
+def calculate_midframes_logic(scenes, frame_rate):
+    """Calculate mid-point timecodes for each scene.
+
+    Vectorized with NumPy so thousands of scenes cost a few array ops
+    instead of a Python loop allocating a FrameTimecode per scene. The
+    midpoints are snapped to exact frame boundaries so ffmpeg seeks land
+    on the same frames the detector saw.
+    """
+    if not scenes:
+        return []
+    starts = np.fromiter((s.get_seconds() for s, _ in scenes), dtype=np.float64, count=len(scenes))
+    ends = np.fromiter((e.get_seconds() for _, e in scenes), dtype=np.float64, count=len(scenes))
+    mids = (starts + ends) * 0.5
+    mid_secs = (mids * frame_rate).astype(np.int64) / frame_rate
+    return [seconds_to_timecode(sec) for sec in mid_secs] # HH:MM:SS.mmm strings
 
 # --- Flet App ---
 def main(page: Page):
@@ -108,6 +117,10 @@ def main(page: Page):
     page.padding = 10
 
     # --- State Variables ---
+    # Session-local state shared between handlers and the extraction thread.
+    # client_storage is for persistence across app restarts and costs an IPC
+    # round-trip per access; a plain dict does neither.
+    state = {}
     selected_video_path_text = Text("No video selected yet.", selectable=True)
     # Default output dir: current_working_directory/extracted_scenes
     default_output_path = os.path.join(os.getcwd(), "extracted_scenes")
@@ -118,14 +131,20 @@ def main(page: Page):
     def on_video_picked(e: FilePickerResultEvent):
         if e.files and len(e.files) > 0:
             selected_video_path_text.value = e.files[0].path
-            # Try to get frame rate for calculate_midframes_logic
+            # Probe the container once and cache everything the extraction
+            # run needs, so no second open is done just for metadata.
             try:
-                temp_video_manager = VideoManager([e.files[0].path])
-                page.client_storage.set("video_frame_rate", temp_video_manager.get_framerate())
-                temp_video_manager.release()
+                video = open_video_stream(e.files[0].path)
+                width, height = video.frame_size
+                state["video_meta"] = {
+                    "fps": video.frame_rate,
+                    "width": width,
+                    "height": height,
+                    "duration": video.duration.get_seconds() if video.duration else None,
+                }
             except Exception as ex:
-                print(f"Could not get frame rate: {ex}")
-                page.client_storage.set("video_frame_rate", 30.0) # Assume 30 fps if error
+                print(f"Could not read video metadata: {ex}")
+                state["video_meta"] = {"fps": 30.0} # Assume 30 fps if error
         else:
             selected_video_path_text.value = "Video selection cancelled or no file chosen."
         page.update()
@@ -188,11 +207,23 @@ def main(page: Page):
         "hist": "0.40",    # PySceneDetect's HistogramDetector default
     }
     threshold_input = TextField(label="Threshold", value=app_default_thresholds[algo_dropdown.value], width=150, text_size=12)
+    # Sweeps candidate thresholds on a fast decimated pass before the real
+    # detection, replacing manual tune-and-rerun cycles.
+    auto_threshold_checkbox = ft.Checkbox(label="Auto-threshold", value=False)
 
     min_scene_len_input = TextField(label="Min Scene Len (frames)", value="15", width=180, text_size=12)
     window_size_input = TextField(label="Window Size (adaptive)", value="2", width=180, text_size=12) # Initial visibility managed by row
     min_content_val_input = TextField(label="Min Content Val (adaptive)", value="15.0", width=200, text_size=12) # Initial visibility managed by row
 
+    # Accuracy vs Speed: detection downscale factor. 0 = auto (cap detection
+    # frames at ~320 px wide), 1 = full resolution, 8 = fastest.
+    speed_slider = ft.Slider(min=0, max=8, divisions=8, value=0, label="{value}", width=300)
+    settings_row_speed = Row(
+        [Text("Accuracy vs Speed (downscale, 0 = auto, 1 = full-res, 8 = fastest):", size=12), speed_slider],
+        alignment=MainAxisAlignment.START,
+        spacing=15
+    )
+
     settings_row2_adaptive = Row(
         [window_size_input, min_content_val_input],
         alignment=MainAxisAlignment.START, 
@@ -224,38 +255,81 @@ def main(page: Page):
     start_button = ElevatedButton("Start Extraction", icon=icons.PLAY_ARROW, height=40)
 
     # --- Extraction Thread Function ---
-    def run_extraction_thread_fn(page_ref: Page, video_p, output_d, algo, thresh_val, min_len_val, win_size_val, min_cont_val_val):
+    def run_extraction_thread_fn(page_ref: Page, video_p, output_d, algo, thresh_val, min_len_val, win_size_val, min_cont_val_val, downscale_val=0, auto_thresh=False):
         
         def update_status_on_ui_thread(message):
             status_text.value = message
             page_ref.update()
 
+        # Thumbnails are buffered and flushed in bursts: every appended
+        # control would otherwise cost one synchronous page.update()
+        # JSON-RPC round-trip, throttling the extraction workers.
+        pending_images = []
+        pending_lock = threading.Lock()
+        last_image_flush = [time.monotonic()]
+
+        def flush_pending_images(force=False):
+            with pending_lock:
+                if not pending_images:
+                    return
+                now = time.monotonic()
+                if not force and len(pending_images) < 8 and now - last_image_flush[0] <= 0.25:
+                    return
+                image_grid.controls.extend(pending_images)
+                pending_images.clear()
+                last_image_flush[0] = now
+            page_ref.update()
+
         def add_image_on_ui_thread(image_path_abs):
-            image_grid.controls.append(
-                Image(
-                    src=image_path_abs,
-                    fit=ImageFit.CONTAIN,
-                    width=150,
-                    height=150,
-                    border_radius=border_radius.all(5),
-                    tooltip=os.path.basename(image_path_abs)
-                )
+            control = Image(
+                src=image_path_abs,
+                fit=ImageFit.CONTAIN,
+                width=150,
+                height=150,
+                border_radius=border_radius.all(5),
+                tooltip=os.path.basename(image_path_abs)
             )
-            page_ref.update()
+            with pending_lock:
+                pending_images.append(control)
+            flush_pending_images()
         
-        current_video_frame_rate = page.client_storage.get("video_frame_rate") or 30.0 # fallback
+        video_meta = state.get("video_meta") or {}
+        current_video_frame_rate = video_meta.get("fps") or 30.0 # fallback
         extraction_successful = False # Flag to track overall success
+        extract_queue = None # Created once the detector is configured
+        workers = []
 
         try:
             update_status_on_ui_thread("Status: Initializing video...")
-            video_manager = VideoManager([video_p])
-            scene_manager = SceneManager()
-            
+            video = open_video_stream(video_p)
+            current_video_frame_rate = video.frame_rate
+            # No StatsManager attached: we never re-run with different
+            # thresholds on cached metrics, so per-frame stats writes would
+            # be pure overhead in the detection loop.
+            scene_manager = SceneManager(stats_manager=None)
+            # Downscale before detection: pixel differencing cost drops
+            # quadratically with the factor, with negligible accuracy loss.
+            # The slider value overrides; 0 means auto (cap width at ~320 px).
+            scene_manager.auto_downscale = False
+            if downscale_val >= 1:
+                scene_manager.downscale = downscale_val
+            else:
+                scene_manager.downscale = detection_downscale(video.frame_size[0])
+
+            if auto_thresh:
+                update_status_on_ui_thread("Status: Sweeping candidate thresholds...")
+                thresh_val = select_auto_threshold(
+                    video_p, algo, min_len_val,
+                    status_callback=lambda msg: update_status_on_ui_thread(f"Status: {msg}")
+                )
+                threshold_input.value = str(thresh_val) # Show the pick in the UI
+                update_status_on_ui_thread(f"Status: Auto-selected threshold {thresh_val}")
+
             update_status_on_ui_thread(f"Status: Configuring '{algo}' detector...")
             if algo == 'adaptive':
                 detector = AdaptiveDetector(adaptive_threshold=thresh_val, min_scene_len=min_len_val, window_width=win_size_val, min_content_val=min_cont_val_val)
             elif algo == 'content':
-                detector = ContentDetector(threshold=thresh_val, min_scene_len=min_len_val)
+                detector = FastContentDetector(threshold=thresh_val, min_scene_len=min_len_val)
             elif algo == 'threshold':
                 detector = ThresholdDetector(threshold=thresh_val, min_scene_len=min_len_val)
             elif algo == 'hist':
@@ -265,43 +339,117 @@ def main(page: Page):
                 raise ValueError(f"Unknown algorithm: {algo}")
             
             scene_manager.add_detector(detector)
-            
+
+            # Pipelined extraction: midframes are known as soon as each scene
+            # closes, so a small worker pool extracts them while detection is
+            # still decoding. Total runtime becomes ~max(detect, extract)
+            # instead of their sum. The bounded queue applies back-pressure
+            # to the decode thread if extraction falls behind.
+            os.makedirs(os.path.join(output_d, "thumbs"), exist_ok=True)
+            extract_queue = queue.Queue(maxsize=8)
+            extract_errors = []
+
+            def extraction_worker():
+                while True:
+                    item = extract_queue.get()
+                    if item is None:
+                        extract_queue.task_done()
+                        break
+                    idx, tc_str = item
+                    try:
+                        out_path, thumb_path = extract_one_frame(video_p, idx, tc_str, output_d)
+                        add_image_on_ui_thread(os.path.abspath(thumb_path))
+                    except subprocess.CalledProcessError as ex:
+                        extract_errors.append(
+                            f"ffmpeg error for {tc_str}: {ex.stderr.decode() if ex.stderr else 'Unknown error'}"
+                        )
+                    except FileNotFoundError:
+                        extract_errors.append("Error: ffmpeg command not found. Please ensure ffmpeg is installed and in your PATH.")
+                    except Exception as ex:
+                        extract_errors.append(f"Error extracting frame at {tc_str}: {ex}")
+                    finally:
+                        extract_queue.task_done()
+
+            num_workers = min(os.cpu_count() or 1, 4)
+            workers = [threading.Thread(target=extraction_worker, daemon=True) for _ in range(num_workers)]
+            for w in workers:
+                w.start()
+
             update_status_on_ui_thread("Status: Starting video processing for scene detection...")
-            video_manager.start()
-            # Provide a callback for new scenes to update UI
+            # Throttled scene callback: every update_status_on_ui_thread call
+            # is a synchronous page.update() round-trip that stalls the
+            # decode thread, so refresh the UI at most every 250 ms of wall
+            # time regardless of how fast scenes are found. The callback also
+            # feeds the extraction queue: each cut closes the scene running
+            # from the previous cut to this one.
+            scene_count = [0]
+            last_cut_frame = [0]
+            last_ui_update = [0.0]
+
+            def on_new_scene(frame_img, frame_num):
+                scene_count[0] += 1
+                mid_frame = (last_cut_frame[0] + frame_num) // 2
+                last_cut_frame[0] = frame_num
+                tc_str = seconds_to_timecode(mid_frame / current_video_frame_rate)
+                extract_queue.put((scene_count[0], tc_str))
+                now = time.monotonic()
+                if now - last_ui_update[0] > 0.25:
+                    last_ui_update[0] = now
+                    update_status_on_ui_thread(
+                        f"Status: {scene_count[0]} scenes detected (frame {frame_num})"
+                    )
+
             scene_manager.detect_scenes(
-                frame_source=video_manager,
-                callback=lambda frame_img, frame_num: update_status_on_ui_thread(f"Status: Scene detected at frame {frame_num}")
+                video=video,
+                show_progress=False,
+                callback=on_new_scene
             )
             scenes = scene_manager.get_scene_list() # List of (FrameTimecode, FrameTimecode)
-            
-            update_status_on_ui_thread(f"Status: Detected {len(scenes)} scenes. Calculating midframes...")
+
+            update_status_on_ui_thread(f"Status: Detected {len(scenes)} scenes. Extracting remaining midframes...")
             if not scenes:
                 update_status_on_ui_thread("Status: No scenes detected.")
                 return
 
-            midframe_timecodes_str = calculate_midframes_logic(scenes, current_video_frame_rate)
-            video_manager.release() # Release video manager after getting scenes and frame rate
-
-            if not midframe_timecodes_str:
-                update_status_on_ui_thread("Status: No midframes to extract.")
-                return
-
-            update_status_on_ui_thread(f"Status: Extracting {len(midframe_timecodes_str)} images to {output_d}...")
-            extract_frames_logic(
-                video_p, midframe_timecodes_str, output_d,
-                status_callback=update_status_on_ui_thread,
-                image_callback=lambda img_path: add_image_on_ui_thread(os.path.abspath(img_path))
-            )
-
-            update_status_on_ui_thread(f"Status: Extraction complete! {len(midframe_timecodes_str)} images saved to {output_d}")
-            extraction_successful = True # Mark as successful if we reach here
+            # The callback only fires on cuts, so the final scene (last cut to
+            # end of video) was never enqueued; hand any remainder to the pool.
+            all_midframes = calculate_midframes_logic(scenes, current_video_frame_rate)
+            for idx in range(scene_count[0], len(all_midframes)):
+                extract_queue.put((idx + 1, all_midframes[idx]))
+
+            extract_queue.join() # All enqueued frames extracted
+            flush_pending_images(force=True)
+
+            for error_message in extract_errors:
+                print(error_message)
+            if extract_errors:
+                # Leave the run marked as failed: the finally block preserves
+                # any status starting with "Error:", so the per-frame failures
+                # stay visible instead of being clobbered by the success
+                # message.
+                saved_count = len(all_midframes) - len(extract_errors)
+                update_status_on_ui_thread(
+                    f"Error: {len(extract_errors)} of {len(all_midframes)} frames failed "
+                    f"({saved_count} images saved to {output_d}). Last: {extract_errors[-1]}"
+                )
+            else:
+                update_status_on_ui_thread(f"Status: Extraction complete! {len(image_grid.controls)} images saved to {output_d}")
+                extraction_successful = True # Mark as successful only when every frame extracted
 
         except Exception as ex:
             error_msg = f"Error during extraction: {str(ex)}"
             print(error_msg) # Log to console as well
             update_status_on_ui_thread(error_msg)
         finally:
+            # Always release the worker pool: without the sentinels, an early
+            # return (no scenes) or an exception during detection would leave
+            # the workers blocked on extract_queue.get() forever.
+            if extract_queue is not None:
+                for _ in workers:
+                    extract_queue.put(None)
+                for w in workers:
+                    w.join()
+            flush_pending_images(force=True) # Never drop buffered thumbnails
             start_button.disabled = False
             progress_bar.visible = False
             # Set final status message based on success
@@ -390,6 +538,8 @@ def main(page: Page):
                 current_min_scene_len,
                 current_window_size,
                 current_min_content_val,
+                int(speed_slider.value or 0),
+                bool(auto_threshold_checkbox.value),
             ),
             daemon=True # Allows main program to exit even if thread is running
         )
@@ -425,6 +575,7 @@ def main(page: Page):
         [
             algo_dropdown,
             threshold_input,
+            auto_threshold_checkbox,
             min_scene_len_input,
         ],
         alignment=MainAxisAlignment.START, spacing=15
@@ -442,6 +593,7 @@ def main(page: Page):
                 Text("Detection Parameters", size=18, weight=ft.FontWeight.BOLD),
                 settings_row1,
                 settings_row2_adaptive,
+                settings_row_speed,
                 ft.Divider(),
                 Row([start_button], alignment=MainAxisAlignment.CENTER),
                 progress_bar,
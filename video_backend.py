@@ -0,0 +1,76 @@
+"""
+video_backend.py
+
+Video decode backend selection shared by the CLI and the GUI.
+
+Prefers PySceneDetect's PyAV backend, which decodes through ffmpeg's
+libraries directly and supports frame/slice threading, over the default
+OpenCV VideoCapture path. Falls back to OpenCV when PyAV is not installed
+or fails to open the file.
+"""
+import subprocess
+
+from scenedetect import open_video
+
+try:
+    from scenedetect.backends.pyav import VideoStreamAv
+except ImportError:
+    VideoStreamAv = None
+
+
+# Detection accuracy is nearly unaffected below this width, while the
+# per-frame differencing cost drops with the square of the factor.
+DETECTION_TARGET_WIDTH = 320
+
+
+def detection_downscale(frame_width):
+    """Downscale factor capping detection frames at ~DETECTION_TARGET_WIDTH px wide."""
+    return max(1, int(frame_width) // DETECTION_TARGET_WIDTH)
+
+
+# Probed once per process; ffmpeg startup is on the extraction hot path.
+_hwaccel_args = None
+
+
+def ffmpeg_hwaccel_args():
+    """Return ffmpeg input arguments enabling GPU decode, if available.
+
+    `ffmpeg -hwaccels` only lists accelerators compiled into the build;
+    common static builds advertise cuda on machines with no NVIDIA GPU,
+    where '-hwaccel cuda' then fails device creation and the whole command
+    exits nonzero. So a tiny throwaway run with '-init_hw_device cuda'
+    (which forces device creation up front) is attempted once instead, and
+    the flags are only used if it succeeds. Only plain '-hwaccel cuda' is
+    emitted (no '-hwaccel_output_format cuda'), so decoded frames land in
+    system memory and remain usable by software filters (select) and the
+    JPEG encoder.
+    """
+    global _hwaccel_args
+    if _hwaccel_args is None:
+        try:
+            result = subprocess.run(
+                ['ffmpeg', '-hide_banner', '-loglevel', 'error',
+                 '-init_hw_device', 'cuda',
+                 '-f', 'lavfi', '-i', 'testsrc=duration=0.1:size=64x64:rate=10',
+                 '-frames:v', '1', '-f', 'null', '-'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            _hwaccel_args = ['-hwaccel', 'cuda'] if result.returncode == 0 else []
+        except (FileNotFoundError, OSError):
+            _hwaccel_args = []
+    return _hwaccel_args
+
+
+def open_video_stream(video_path):
+    """Open video_path for detection, preferring the PyAV backend.
+
+    Returns a scenedetect VideoStream suitable for
+    SceneManager.detect_scenes(video=...).
+    """
+    if VideoStreamAv is not None:
+        try:
+            # AUTO enables both frame- and slice-level decoder threading.
+            return VideoStreamAv(video_path, threading_mode='AUTO')
+        except Exception as ex:
+            print(f"PyAV backend failed for {video_path} ({ex}); falling back to OpenCV.")
+    return open_video(video_path)